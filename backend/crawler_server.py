@@ -22,6 +22,7 @@ from crawler import (
     WebCrawler, 
     DataProcessor, 
     StorageManager, 
+    CrawlJournal,
     UrbanLegendAnalyzer, 
     calculate_statistics,
     NumpyEncoder
@@ -45,6 +46,7 @@ CORS(app)  # 允许跨域请求
 # 配置文件上传路径
 UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
 RESULTS_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+HTTP_CACHE_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'http_cache')
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(RESULTS_FOLDER, exist_ok=True)
 
@@ -100,6 +102,7 @@ def run_crawler_task(task_id, config):
         depth = config.get('depth', 2)
         format_type = config.get('format', 'html')
         concurrency = config.get('concurrency', 3)
+        engine = config.get('engine', 'thread')
         enable_urban_legend = config.get('enable_urban_legend', True)
         
         logger.info(f"任务 {task_id} 开始运行，爬取 {len(urls)} 个URL，深度为 {depth}")
@@ -110,13 +113,19 @@ def run_crawler_task(task_id, config):
             'depth': depth,
             'format': format_type,
             'concurrency': concurrency,
+            'engine': engine,
             'urban_legend_enabled': enable_urban_legend
         }
         
         # 初始化爬虫组件
-        crawler = WebCrawler(max_workers=concurrency)
-        processor = DataProcessor()
-        storage = StorageManager(base_dir=os.path.join(RESULTS_FOLDER, task_id))
+        crawler = WebCrawler.from_config(config, cache_dir=HTTP_CACHE_FOLDER)
+        processor = DataProcessor(html_parser=crawler.html_parser)
+        task_dir = os.path.join(RESULTS_FOLDER, task_id)
+        storage = StorageManager(base_dir=task_dir)
+        
+        # 在任务目录中保存配置和爬取进度日志，服务器崩溃后可通过 /api/resume/<task_id> 继续
+        storage.save_config(config, task_dir)
+        journal = CrawlJournal(os.path.join(task_dir, StorageManager.JOURNAL_FILENAME))
         
         # 可选：初始化都市传说分析器
         urban_legend_analyzer = None
@@ -132,21 +141,15 @@ def run_crawler_task(task_id, config):
             "depth": depth,
             "format": format_type,
             "concurrency": concurrency,
+            "engine": engine,
             "urban_legend_enabled": enable_urban_legend
         }
         
-        # 批量爬取
-        all_results = crawler.batch_crawl(urls, depth)
-        
-        # 更新任务状态
-        tasks[task_id]['progress'] = 30
-        tasks[task_id]['details']['crawled_pages'] = len(all_results)
-        logger.info(f"任务 {task_id} 爬取完成，共获取 {len(all_results)} 个页面")
-        
-        # 处理结果
+        # 处理结果：每个页面抓取完成时立即处理，之后结果中不再保留页面的HTML和解析文档
         processed_content = []
         
-        for url, data in all_results.items():
+        def process_page(url, data):
+            """处理一个抓取完成的页面（由调度循环在页面完成时调用）"""
             # 提取内容
             title = data.get("title")
             content = data.get("content")
@@ -155,7 +158,7 @@ def run_crawler_task(task_id, config):
             
             # 跳过无效内容
             if not content and not html_content:
-                continue
+                return
                 
             # 处理HTML内容
             if html_content:
@@ -164,14 +167,14 @@ def run_crawler_task(task_id, config):
                                                      html_content.startswith("UNSUPPORTED_CONTENT_")):
                     clean_content = content  # 使用parse_html生成的描述性内容
                 else:
-                    # 正常的HTML内容
-                    clean_html = processor.clean_html(html_content, url)
+                    # 正常的HTML内容 - 使用抓取时构建的解析文档
+                    document = data["document"]
                     
                     # 提取文本或格式化HTML
                     if format_type == "txt":
-                        clean_content = processor.extract_text_from_html(clean_html)
+                        clean_content = document.text
                     else:
-                        clean_content = clean_html
+                        clean_content = document.cleaned_html
                         
                 # 提取关键词
                 keywords = []
@@ -181,7 +184,7 @@ def run_crawler_task(task_id, config):
                 # 提取媒体内容信息
                 media = {}
                 if html_content and not isinstance(html_content, str) and not (html_content.startswith("PDF_CONTENT_") or html_content.startswith("UNSUPPORTED_CONTENT_")):
-                    media = processor.extract_embedded_media(html_content, url) if hasattr(processor, 'extract_embedded_media') else {}
+                    media = document.media
                 
                 # 都市传说分析
                 urban_legend_result = None
@@ -202,6 +205,7 @@ def run_crawler_task(task_id, config):
                     "depth": data.get("depth", 0),
                     "format": format_type,
                     "status": status,
+                    "encoding": data.get("encoding"),
                     "embedded_media": media if media else None
                 }
                 
@@ -211,6 +215,22 @@ def run_crawler_task(task_id, config):
                 
                 processed_content.append(processed_item)
         
+        # 批量爬取
+        all_results = crawler.batch_crawl(urls, depth, journal=journal, sitemaps=config.get('sitemaps'), on_page=process_page)
+        
+        # 更新任务状态
+        tasks[task_id]['progress'] = 30
+        tasks[task_id]['details']['crawled_pages'] = len(all_results)
+        if crawler.circuit_breaker is not None:
+            breaker_stats = crawler.circuit_breaker.get_stats()
+            tasks[task_id]['details']['circuit_breaker'] = {
+                'trips': breaker_stats['trips'],
+                'rejected': breaker_stats['rejected'],
+                'open_hosts': breaker_stats['openHosts'],
+                'hosts': {host: info['state'] for host, info in breaker_stats['hosts'].items()}
+            }
+        logger.info(f"任务 {task_id} 爬取完成，共获取 {len(all_results)} 个页面")
+        
         # 更新任务状态
         tasks[task_id]['progress'] = 60
         tasks[task_id]['details']['processed_pages'] = len(processed_content)
@@ -245,9 +265,11 @@ def run_crawler_task(task_id, config):
         end_time = time.time()
         task_info["end_time"] = end_time
         task_info["duration"] = end_time - start_time
+        # 预算用尽时结果不完整
+        task_info["budget_limited"] = crawler.budget.limited
         
         # 计算统计数据
-        statistics = calculate_statistics(all_results, processed_content, categorized_content, task_info)
+        statistics = calculate_statistics(all_results, processed_content, categorized_content, task_info, crawler.get_stats())
         
         # 如果启用了都市传说分析，添加相关统计
         if enable_urban_legend and urban_legend_analyzer:
@@ -292,6 +314,7 @@ def run_crawler_task(task_id, config):
         tasks[task_id]['result_file'] = result_file
         tasks[task_id]['details']['success_rate'] = statistics['successRate']
         tasks[task_id]['details']['duration'] = task_info['duration']
+        tasks[task_id]['details']['budget_limited'] = task_info['budget_limited']
         
         logger.info(f"任务 {task_id} 成功完成，用时 {task_info['duration']:.2f} 秒")
         
@@ -308,6 +331,8 @@ def run_crawler_task(task_id, config):
         # 关闭资源
         if 'crawler' in locals():
             crawler.close()
+        if 'journal' in locals():
+            journal.close()
 
 @app.route('/api/submit', methods=['POST'])
 def submit_task():
@@ -320,8 +345,8 @@ def submit_task():
         config = request.json
         
         # 验证配置
-        if 'urls' not in config or not config['urls']:
-            return jsonify({'error': '配置中未包含URLs'}), 400
+        if not config.get('urls') and not config.get('sitemaps'):
+            return jsonify({'error': '配置中未包含URLs或sitemaps'}), 400
         
         # 创建任务ID
         task_id = str(uuid.uuid4())
@@ -475,6 +500,51 @@ def cancel_task(task_id):
             'status': task['status']
         }), 400
 
+@app.route('/api/resume/<task_id>', methods=['POST'])
+def resume_task(task_id):
+    """恢复中断的任务（包括服务器重启前未完成的任务），从进度日志继续爬取"""
+    task = tasks.get(task_id)
+    if task and task['status'] in (TASK_STATUS['PENDING'], TASK_STATUS['RUNNING']):
+        return jsonify({
+            'error': '任务仍在运行，无法恢复',
+            'status': task['status']
+        }), 400
+    
+    # 任务ID只能是submit_task生成的UUID，防止路径穿越
+    try:
+        uuid.UUID(task_id)
+    except ValueError:
+        return jsonify({'error': '任务不存在'}), 404
+    
+    task_dir = os.path.join(RESULTS_FOLDER, task_id)
+    config = StorageManager.load_config(task_dir)
+    if config is None:
+        return jsonify({'error': '任务没有可恢复的进度'}), 404
+    
+    tasks[task_id] = {
+        'id': task_id,
+        'status': TASK_STATUS['PENDING'],
+        'progress': 0,
+        'created_at': task['created_at'] if task else datetime.now().isoformat(),
+        'config': config,
+        'resumed': True
+    }
+    
+    thread = threading.Thread(
+        target=run_crawler_task,
+        args=(task_id, config)
+    )
+    thread.daemon = True
+    thread.start()
+    
+    logger.info(f"已恢复任务，ID: {task_id}")
+    
+    return jsonify({
+        'task_id': task_id,
+        'status': tasks[task_id]['status'],
+        'message': '任务已恢复'
+    }), 202
+
 @app.route('/api/upload', methods=['POST'])
 def upload_config():
     """上传配置文件"""
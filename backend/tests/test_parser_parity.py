@@ -0,0 +1,76 @@
+"""
+HTML解析后端一致性测试
+
+parser_parity_pages.json中保存了若干页面（格式同crawler_results.json，content为页面HTML），
+每个页面分别用html.parser（参照实现）和selectolax、lxml后端解析，
+标题、链接、内嵌媒体和纯文本应当完全相同。未安装的后端跳过
+"""
+
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from crawler import (  # noqa: E402
+    LexborParserBackend, ParsedDocument, SoupParserBackend, available_html_parsers, extract_embedded_media
+)
+
+PAGES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'parser_parity_pages.json')
+AVAILABLE = available_html_parsers()
+
+
+def load_pages():
+    with open(PAGES_FILE, encoding='utf-8') as f:
+        return json.load(f)['content']
+
+
+class ParserParityTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.pages = load_pages()
+        cls.reference = SoupParserBackend('html.parser')
+
+    def assert_parity(self, backend):
+        for page in self.pages:
+            with self.subTest(url=page['url']):
+                expected = ParsedDocument(page['content'], page['url'], self.reference)
+                actual = ParsedDocument(page['content'], page['url'], backend)
+                self.assertEqual(actual.title, expected.title)
+                self.assertEqual(actual.links, expected.links)
+                self.assertEqual(actual.media, expected.media)
+                self.assertEqual(actual.content, expected.content)
+                self.assertEqual(actual.text, expected.text)
+                self.assertEqual(extract_embedded_media(page['content'], page['url'], backend), expected.media)
+
+    def test_reference_titles(self):
+        for page in self.pages:
+            with self.subTest(url=page['url']):
+                self.assertEqual(ParsedDocument(page['content'], page['url'], self.reference).title, page['title'])
+
+    def test_corpus_covers_media(self):
+        media = {}
+        for page in self.pages:
+            media.update(extract_embedded_media(page['content'], page['url'], self.reference))
+        self.assertEqual(set(media), {'youtube', 'vimeo', 'twitter', 'instagram', 'other_embedded'})
+
+    @unittest.skipUnless('selectolax' in AVAILABLE, "selectolax未安装")
+    def test_selectolax(self):
+        self.assert_parity(LexborParserBackend())
+
+    @unittest.skipUnless('lxml' in AVAILABLE, "lxml未安装")
+    def test_lxml(self):
+        self.assert_parity(SoupParserBackend('lxml'))
+
+    @unittest.skipUnless('selectolax' in AVAILABLE, "selectolax未安装")
+    def test_selectolax_soup_follows_fallback_order(self):
+        # soup()按HTML_PARSER_BACKENDS的顺序使用selectolax之后第一个已安装的tree builder
+        expected = 'lxml' if 'lxml' in AVAILABLE else 'html.parser'
+        self.assertEqual(LexborParserBackend().soup('<p>x</p>').builder.NAME, expected)
+        self.assertEqual(LexborParserBackend('html.parser').soup('<p>x</p>').builder.NAME, 'html.parser')
+
+
+if __name__ == '__main__':
+    unittest.main()
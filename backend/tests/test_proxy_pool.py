@@ -0,0 +1,147 @@
+"""
+代理池测试
+
+在本地启动两种代理替身：正常代理直接返回页面，故障代理总是返回502。
+验证代理选择、健康分过低时的隔离、隔离结束后的恢复，以及所有代理不可用时的等待超时和回退方式
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from crawler import ProxyPool, WebCrawler  # noqa: E402
+
+
+class StandInServer:
+    """本地HTTP服务器替身，记录收到的请求路径"""
+
+    def __init__(self, status):
+        self.status = status
+        self.paths = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.paths.append(self.path)
+                body = f"<html><head><title>{server.status}</title></head><body>ok</body></html>".encode()
+                self.send_response(server.status)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class ProxyPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.good = StandInServer(200)
+        self.good_too = StandInServer(200)
+        self.bad = StandInServer(502)
+
+    def tearDown(self):
+        for server in (self.good, self.good_too, self.bad):
+            server.close()
+
+    def fetch(self, pool, url='http://example.invalid/page'):
+        """经由代理池请求一次，返回所用代理的名称"""
+        proxy = pool.acquire(timeout=1)
+        self.assertIsNotNone(proxy)
+        status = 0
+        try:
+            status = requests.get(url, proxies={'http': proxy['url']}, timeout=5).status_code
+        finally:
+            pool.release(proxy, status)
+        return proxy['label']
+
+    def test_round_robin_selection(self):
+        pool = ProxyPool([self.good.url, self.good_too.url])
+        labels = [self.fetch(pool) for _ in range(4)]
+        self.assertEqual(labels, [self.good.url, self.good_too.url] * 2)
+        # 代理收到的是完整的目标URL
+        self.assertEqual(self.good.paths, ['http://example.invalid/page'] * 2)
+        self.assertEqual(len(self.good_too.paths), 2)
+
+    def test_least_loaded_prefers_idle_proxy(self):
+        pool = ProxyPool([self.good.url, self.good_too.url], strategy='least_loaded', max_concurrency=2)
+        busy = pool.acquire()
+        self.assertNotEqual(pool.acquire()['label'], busy['label'])
+
+    def test_quarantine_and_recovery(self):
+        pool = ProxyPool([self.bad.url, self.good.url], window=4, min_samples=2, quarantine_seconds=0.3)
+        for _ in range(4):
+            self.fetch(pool)
+        stats = pool.get_stats()
+        self.assertEqual(stats['quarantined'], 1)
+        self.assertEqual(stats['proxies'][self.bad.url]['quarantines'], 1)
+        self.assertGreater(stats['proxies'][self.bad.url]['quarantinedFor'], 0)
+
+        # 隔离期间只使用正常代理
+        bad_requests = len(self.bad.paths)
+        self.assertEqual({self.fetch(pool) for _ in range(3)}, {self.good.url})
+        self.assertEqual(len(self.bad.paths), bad_requests)
+
+        # 隔离结束后重新参与调度
+        time.sleep(0.35)
+        self.assertEqual(pool.get_stats()['quarantined'], 0)
+        self.assertIn(self.bad.url, {self.fetch(pool) for _ in range(2)})
+        self.assertEqual(len(self.bad.paths), bad_requests + 1)
+
+    def quarantined_pool(self, **kwargs):
+        """只有一个代理且已被隔离的代理池"""
+        pool = ProxyPool([self.bad.url], min_samples=2, quarantine_seconds=60, **kwargs)
+        for _ in range(2):
+            self.fetch(pool)
+        self.assertEqual(pool.get_stats()['quarantined'], 1)
+        return pool
+
+    def test_acquire_times_out(self):
+        pool = self.quarantined_pool()
+        started = time.monotonic()
+        self.assertIsNone(pool.acquire(timeout=0.1))
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertIsNone(asyncio.run(pool.acquire_async(timeout=0.1)))
+        self.assertEqual(pool.get_stats()['waitTimeouts'], 2)
+        self.assertEqual(pool.async_waiters, [])
+
+    def crawler_with(self, pool):
+        crawler = WebCrawler.from_config({
+            'http_cache': False, 'robots': False, 'encoding_profile_cache': False, 'coalesce_requests': False
+        })
+        crawler.proxy_pool = pool
+        return crawler
+
+    def test_fallback_fail(self):
+        crawler = self.crawler_with(self.quarantined_pool(wait_timeout=0.1, fallback='fail'))
+        self.assertEqual(crawler._fetch_once(self.good.url + '/direct'), (None, 0, None))
+        self.assertEqual(self.good.paths, [])
+
+    def test_fallback_direct(self):
+        crawler = self.crawler_with(self.quarantined_pool(wait_timeout=0.1, fallback='direct'))
+        html, status, retry = crawler._fetch_once(self.good.url + '/direct')
+        self.assertEqual(status, 200)
+        self.assertIn('ok', html)
+        self.assertEqual(self.good.paths, ['/direct'])
+
+
+if __name__ == '__main__':
+    unittest.main()